@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import itertools
+import threading
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from dbagent import get_all_tables
+
+SNAPSHOT_DIR = ".snapshots"  # Immutable per-generation copies of the source DB live here
+
+# Shared by every manager, so a reopened tenant never reuses a generation a stale cursor or cache still holds
+_generations = itertools.count(1)
+
+
+class DBSnapshot:
+    """One immutable, generation-numbered copy of the source database."""
+
+    def __init__(self, path: str, generation: int, signature: Tuple, user_version: int):
+        self.path = path
+        self.generation = generation
+        self.signature = signature
+        self.user_version = user_version
+        self.tables: List[str] = get_all_tables(path)
+        self.created_at = time.time()
+        self.refs = 0
+        self.retired = False
+
+
+def _source_signature(db_path: str) -> Tuple:
+    st = os.stat(db_path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _source_user_version(db_path: str) -> int:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class SnapshotManager:
+    """
+    Watches `db_path` and publishes a fresh snapshot whenever ingestion bumps its
+    `PRAGMA user_version` (excel_to_sqlite.py and summary_tables.py both do).
+
+    Checks and copies run on a background thread. New queries pick up the latest
+    snapshot via `acquire()`; queries already running keep their own snapshot file
+    until they release it, after which retired snapshots are deleted.
+    """
+
+    def __init__(self, db_path: str, snapshot_dir: str = SNAPSHOT_DIR, check_interval: float = 2.0,
+                 clear_stale: bool = True):
+        self.db_path = db_path
+        self.snapshot_dir = snapshot_dir
+        self.check_interval = check_interval
+        # Unique per manager, so a reopened manager never overwrites files an older one still serves
+        self._token = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()  # Guards the published snapshot and ref counts; never held while copying
+        self._reload_lock = threading.Lock()
+        self._checked_signature: Optional[Tuple] = None
+        self._current: Optional[DBSnapshot] = None
+        self._retired: List[DBSnapshot] = []
+        self._stop = threading.Event()
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        if clear_stale:
+            self._clear_stale_files()
+        if not self.reload(force=True):
+            raise OSError(f"Could not open a snapshot of {db_path}")
+
+        self._watcher = threading.Thread(target=self._watch, name=f"snapshot-{self._token}", daemon=True)
+        self._watcher.start()
+
+    @property
+    def generation(self) -> int:
+        return self._current.generation if self._current else 0
+
+    def _clear_stale_files(self):
+        prefix = os.path.splitext(os.path.basename(self.db_path))[0] + "."
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith(prefix) and name.endswith(".db"):
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, name))
+                except OSError:
+                    pass
+
+    def _copy_source(self, generation: int) -> Tuple[str, int]:
+        base = os.path.splitext(os.path.basename(self.db_path))[0]
+        target = os.path.join(self.snapshot_dir, f"{base}.{self._token}.{generation}.db")
+        # The backup API yields a consistent copy even if ingestion is writing to the source
+        src = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst)
+            user_version = dst.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            dst.close()
+            src.close()
+        return target, user_version
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """Publish a new snapshot if ingestion published new data. Returns True when switched."""
+        with self._reload_lock:
+            try:
+                signature = _source_signature(self.db_path)
+                if not force and signature == self._checked_signature:
+                    return False
+                user_version = _source_user_version(self.db_path)
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Snapshot check failed for {self.db_path}: {e}")
+                return False
+
+            self._checked_signature = signature
+            if not force and self._current and user_version <= self._current.user_version:
+                # File changed but the generation was not bumped: ingestion is still running
+                return False
+
+            generation = next(_generations)
+            try:
+                path, user_version = self._copy_source(generation)
+                snapshot = DBSnapshot(path, generation, signature, user_version)
+            except sqlite3.Error as e:
+                # Keep serving the previous snapshot; retry on the next check
+                self._checked_signature = None
+                logging.error(f"Snapshot reload failed for {self.db_path}: {e}")
+                return False
+
+            with self._lock:
+                if self._stop.is_set():
+                    # Closed while copying: nobody will ever serve or collect this file
+                    self._remove_file(path)
+                    return False
+                previous, self._current = self._current, snapshot
+                if previous:
+                    previous.retired = True
+                    self._retired.append(previous)
+                self._collect_retired()
+
+        print(f"[DEBUG] Switched {self.db_path} to snapshot generation {generation} ({len(snapshot.tables)} tables)")
+        logging.info(f"DB snapshot generation {generation} (user_version {user_version}) published for {self.db_path}")
+        return True
+
+    def current(self) -> DBSnapshot:
+        return self._current
+
+    def pin(self) -> DBSnapshot:
+        """Pin the current snapshot; pair every call with `unpin()`."""
+        with self._lock:
+            # Read and pin under one lock so a concurrent reload cannot delete it first
+            snapshot = self._current
+            if snapshot is None:
+                raise RuntimeError(f"Snapshots of {self.db_path} are closed")
+            snapshot.refs += 1
+            return snapshot
+
+    def unpin(self, snapshot: DBSnapshot):
+        with self._lock:
+            snapshot.refs -= 1
+            self._collect_retired()
+
+    @contextmanager
+    def acquire(self):
+        """Pin the current snapshot for the duration of one query."""
+        snapshot = self.pin()
+        try:
+            yield snapshot
+        finally:
+            self.unpin(snapshot)
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.error(f"Could not remove snapshot {path}: {e}")
+
+    def _collect_retired(self):
+        # Caller must hold self._lock
+        still_in_use = []
+        for snapshot in self._retired:
+            if snapshot.refs > 0:
+                still_in_use.append(snapshot)
+                continue
+            self._remove_file(snapshot.path)
+        self._retired = still_in_use
+
+    def close(self):
+        """
+        Stop serving; the last snapshot is deleted once no query holds it.
+        Waits for a reload that is mid-copy, so do not call it on the event loop.
+        """
+        self._stop.set()
+        with self._lock:
+            if self._current:
+                self._current.retired = True
+                self._retired.append(self._current)
+                self._current = None
+            self._collect_retired()
+        if threading.current_thread() is not self._watcher:
+            self._watcher.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "tables": len(self._current.tables) if self._current else 0,
+                "retired_in_use": len(self._retired),
+            }
@@ -1,15 +1,23 @@
+import os
+import re
 import sqlite3
-from mistral_helper import client, MODEL
-from typing import List
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from mistral_helper import complete
+from typing import List, Tuple
 import difflib
 import logging
 
+from preview import build_preview
 from prompt_templates import (
     get_table_selection_prompt,
     get_sql_generation_prompt,
     get_no_result_prompt,
     get_result_summary_prompt,
     get_intent_prompt,
+    get_retrieval_answer_prompt,
+    DEFAULT_COLLEGE,
 )
 
 logging.basicConfig(
@@ -18,6 +26,35 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+MAX_CACHED_ROWS = 500  # Larger results keep only their SQL; refinements then go back to SQLite
+PAGE_SIZE = 25  # Rows summarized per answer; the rest stay in SQLite behind a ResultCursor
+
+class CachedResult:
+    """Compact copy of the last answered query, kept for cheap follow-up refinements."""
+
+    def __init__(self, question: str, tables: List[str], sql: str, col_names: List[str], rows: List[tuple], complete: bool = True,
+                 generation: int = None):
+        self.question = question
+        self.generation = generation  # Snapshot the rows came from; other generations must rerun the SQL
+        self.tables = list(tables)
+        self.sql = sql.strip().rstrip(";")
+        self.col_names = list(col_names)
+        self.complete = complete and len(rows) <= MAX_CACHED_ROWS
+        self.rows = [tuple(row) for row in rows[:MAX_CACHED_ROWS]]
+
+class ResultCursor:
+    """Offset into a large result, so "show more" reads the next page from SQLite without replanning."""
+
+    def __init__(self, question: str, sql: str, col_names: List[str], offset: int, page_size: int = PAGE_SIZE,
+                 generation: int = None):
+        self.question = question
+        self.generation = generation  # OFFSET paging is only consistent on the snapshot that served page 1
+        self.sql = sql.strip().rstrip(";")
+        self.col_names = list(col_names)
+        self.offset = offset
+        self.page_size = page_size
+        self.exhausted = False
+
 class AssistantContext:
     def __init__(self):
         self.user_query = ""
@@ -25,9 +62,56 @@ class AssistantContext:
         self.schema_description = ""
         self.generated_sql = ""
         self.history = []
-
-    def reset(self):
+        self.last_result = None
+        self.result_cursor = None
+        self.vectorstore_path = None  # Retrieval fallback source for this college; None disables it
+        self.on_preview = None  # Called with a masked table of the rows before the summary is generated
+        self.db_generation = None  # Snapshot generation the current query runs against
+        self.tenant_id = ""  # Tags log lines so each college's queries can be told apart
+        self.college = DEFAULT_COLLEGE  # Institution named in the prompts
+
+    def reset(self, keep_last_result: bool = True):
+        last_result = self.last_result
         self.__init__()
+        if keep_last_result:
+            self.last_result = last_result
+
+@lru_cache(maxsize=128)
+def _term_pattern(term: str):
+    return re.compile(rf"(?<![a-z0-9]){re.escape(term.lower())}(?![a-z0-9])")
+
+def value_matches(value, term: str) -> bool:
+    """Whole-word, case-insensitive match used by refinements both in memory and in SQL (REFINE_MATCH)."""
+    return value is not None and _term_pattern(term).search(str(value).lower()) is not None
+
+def result_sort_key(value) -> tuple:
+    """Sort key for refinements; numbers stored as text ("1,29,000") still sort numerically."""
+    if isinstance(value, (int, float)):
+        return (0, value, "")
+    text = "" if value is None else str(value)
+    try:
+        return (0, float(text.replace(",", "").replace("₹", "").strip()), "")
+    except ValueError:
+        return (1, 0, text.lower())
+
+def connect_results(db_path: str) -> sqlite3.Connection:
+    """Connection for refined and paged SQL, with the same match and sort rules as the in-memory path."""
+    conn = sqlite3.connect(db_path)
+    conn.create_function("REFINE_MATCH", 2, lambda value, term: int(value_matches(value, term)), deterministic=True)
+    # ORDER BY SORT_RANK(c), SORT_NUM(c), SORT_TEXT(c) orders rows exactly like result_sort_key
+    conn.create_function("SORT_RANK", 1, lambda value: result_sort_key(value)[0], deterministic=True)
+    conn.create_function("SORT_NUM", 1, lambda value: result_sort_key(value)[1], deterministic=True)
+    conn.create_function("SORT_TEXT", 1, lambda value: result_sort_key(value)[2], deterministic=True)
+    return conn
+
+def send_preview(ctx: AssistantContext, col_names: List[str], rows: List[tuple], has_more: bool = False):
+    if not ctx.on_preview or not rows:
+        return
+    try:
+        ctx.on_preview(build_preview(col_names, rows, has_more))
+    except Exception as e:
+        # A failed preview must never cost the user the actual answer
+        logging.error(f"[{ctx.tenant_id}] Preview failed: {e}")
 
 def get_all_tables(db_path: str) -> List[str]:
     conn = sqlite3.connect(db_path)
@@ -82,9 +166,33 @@ def get_table_foreign_keys(db_path: str, table_name: str) -> List[str]:
     conn.close()
     return [f"- {table_name}.{fkey[3]} references {fkey[2]}.{fkey[4]}" for fkey in fkeys]
 
+MAX_METADATA_ENTRIES = 512  # Shared by all tenants; old snapshot generations age out
+_metadata_cache: "OrderedDict[tuple, Tuple[str, List[str], List[str]]]" = OrderedDict()
+_metadata_lock = threading.Lock()
+
+def get_table_metadata(db_path: str, table_name: str) -> Tuple[str, List[str], List[str]]:
+    """Schema text, foreign keys and column names, cached per database file version."""
+    key = (os.path.abspath(db_path), os.stat(db_path).st_mtime_ns, table_name)
+    with _metadata_lock:
+        if key in _metadata_cache:
+            _metadata_cache.move_to_end(key)
+            return _metadata_cache[key]
+
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info('{table_name}')")
+        headers = [col[1] for col in cursor.fetchall()]
+    metadata = (get_table_schema(db_path, table_name), get_table_foreign_keys(db_path, table_name), headers)
+
+    with _metadata_lock:
+        _metadata_cache[key] = metadata
+        while len(_metadata_cache) > MAX_METADATA_ENTRIES:
+            _metadata_cache.popitem(last=False)
+    return metadata
+
 def find_tables(user_query: str, available_tables: List[str]) -> List[str]:
     messages = get_table_selection_prompt(user_query, available_tables)
-    response = client.chat.complete(model=MODEL, messages=messages, max_tokens=50, temperature=0)
+    response = complete("table_selection", messages, temperature=0)
     raw = response.choices[0].message.content.strip()
 
     raw_tables = [t.strip() for t in raw.split(",") if t.strip()]
@@ -110,16 +218,12 @@ def generate_sql_query(ctx: AssistantContext, db_path: str, use_like: bool = Fal
     data_samples = []
 
     for table in ctx.selected_tables:
-        schema = get_table_schema(db_path, table)
+        schema, fkeys, headers = get_table_metadata(db_path, table)
         schema_parts.append(f"Schema for table {table}:\n{schema}")
-        foreign_key_info.extend(get_table_foreign_keys(db_path, table))
+        foreign_key_info.extend(fkeys)
          # Get sample data
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info('{table}')")
-            headers = [col[1] for col in cursor.fetchall()]
-            sample_rows = get_table_data_sample(db_path, table, max_rows=10)
-            sample_data_str = format_table_data_sample(headers, sample_rows)
+        sample_rows = get_table_data_sample(db_path, table, max_rows=10)
+        sample_data_str = format_table_data_sample(headers, sample_rows)
         data_samples.append(f"Sample data for table {table}:\n{sample_data_str}")
 
     ctx.schema_description = "\n\n".join(schema_parts)
@@ -136,7 +240,7 @@ def generate_sql_query(ctx: AssistantContext, db_path: str, use_like: bool = Fal
     # print("[debug] Full schema + data context sent to LLM:\n", prompt_context)
 
     messages = get_sql_generation_prompt(ctx, use_like, extra_context=prompt_context)
-    response = client.chat.complete(model=MODEL, messages=messages, max_tokens=512, temperature=0)
+    response = complete("sql_generation", messages, temperature=0)
     ctx.generated_sql = response.choices[0].message.content.strip().strip("`").replace("sql", "").strip()
     return ctx.generated_sql
 
@@ -146,10 +250,11 @@ def execute_and_interpret(ctx: AssistantContext, db_path: str) -> str:
     print(f'[DEBUG]: Generated SQL is: {ctx.generated_sql}')
     try:
         cursor.execute(ctx.generated_sql)
-        rows = cursor.fetchall()
+        # Cache up to MAX_CACHED_ROWS for refinements; only the first page is summarized
+        all_rows = cursor.fetchmany(MAX_CACHED_ROWS + 1)
         col_names = [desc[0] for desc in cursor.description]
     except Exception as e:
-        logging.error(f"SQL execution issue: {e}")
+        logging.error(f"[{ctx.tenant_id}] SQL execution issue: {e}")
         return (
             "⚠️ Hmm, something went wrong while executing your request.\n"
             "Please try again, and if the issue continues, kindly contact support or the office for assistance."
@@ -157,15 +262,98 @@ def execute_and_interpret(ctx: AssistantContext, db_path: str) -> str:
     finally:
         conn.close()
 
+    has_more = len(all_rows) > PAGE_SIZE
+    rows = all_rows[:PAGE_SIZE]
+    ctx.result_cursor = (
+        ResultCursor(ctx.user_query, ctx.generated_sql, col_names, offset=PAGE_SIZE, generation=ctx.db_generation)
+        if has_more else None
+    )
+    ctx.last_result = CachedResult(ctx.user_query, ctx.selected_tables, ctx.generated_sql, col_names, all_rows,
+                                   generation=ctx.db_generation)
+
     if len(rows) == 0:
-        messages = get_no_result_prompt(ctx.user_query)
-        response = client.chat.complete(model=MODEL, messages=messages, max_tokens=200, temperature=0.3)
+        messages = get_no_result_prompt(ctx.user_query, ctx.college)
+        response = complete("no_result", messages, temperature=0.3)
         return response.choices[0].message.content.strip()
 
-    messages = get_result_summary_prompt(ctx.user_query, col_names, rows, ctx.generated_sql)
-    response = client.chat.complete(model=MODEL, messages=messages, max_tokens=1000, temperature=0.3)
+    send_preview(ctx, col_names, rows, has_more)
+    messages = get_result_summary_prompt(ctx.user_query, col_names, rows, ctx.generated_sql, has_more=has_more, college=ctx.college)
+    response = complete("result_summary", messages, temperature=0.3)
+    return response.choices[0].message.content.strip()
+
+def fetch_next_page(result_cursor: ResultCursor, db_path: str) -> List[tuple]:
+    conn = connect_results(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT * FROM ({result_cursor.sql}) LIMIT ? OFFSET ?",
+            (result_cursor.page_size + 1, result_cursor.offset),
+        )
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    result_cursor.exhausted = len(rows) <= result_cursor.page_size
+    rows = rows[:result_cursor.page_size]
+    result_cursor.offset += len(rows)
+    return rows
+
+def show_more_results(ctx: AssistantContext, db_path: str) -> str:
+    result_cursor = ctx.result_cursor
+    if not result_cursor or result_cursor.exhausted:
+        return "There are no further results for your previous question."
+    if result_cursor.generation != ctx.db_generation:
+        # The data was reloaded since page 1; continuing by OFFSET could skip or repeat rows
+        ctx.result_cursor = None
+        return (
+            "The college records were updated since your previous question.\n"
+            "Please ask it again to see the latest results."
+        )
+
+    start = result_cursor.offset + 1
+    try:
+        rows = fetch_next_page(result_cursor, db_path)
+    except sqlite3.Error as e:
+        logging.error(f"[{ctx.tenant_id}] Failed to fetch next page: {e}")
+        ctx.result_cursor = None
+        return (
+            "⚠️ Hmm, something went wrong while loading more results.\n"
+            "Please ask your question again to see the full list."
+        )
+
+    if not rows:
+        ctx.result_cursor = None
+        return "There are no further results for your previous question."
+
+    logging.info(f"[{ctx.tenant_id}] Paged Query: {result_cursor.question} (rows {start}-{result_cursor.offset})")
+    send_preview(ctx, result_cursor.col_names, rows, not result_cursor.exhausted)
+    question = f"{result_cursor.question} (continued, results {start} to {result_cursor.offset})"
+    messages = get_result_summary_prompt(question, result_cursor.col_names, rows, result_cursor.sql,
+                                         has_more=not result_cursor.exhausted, college=ctx.college)
+    response = complete("result_summary", messages, temperature=0.3)
+    if result_cursor.exhausted:
+        ctx.result_cursor = None
     return response.choices[0].message.content.strip()
 
+def answer_from_retrieval(ctx: AssistantContext) -> str:
+    """Semantic lookup over the cached college records, used when generating or running the SQL fails."""
+    if not ctx.vectorstore_path:
+        return ""
+    from retrieval import get_retriever
+    retriever = get_retriever(ctx.vectorstore_path)
+    if retriever is None:
+        return ""
+    try:
+        hits = retriever.search(ctx.user_query, tables=ctx.selected_tables)
+        if not hits:
+            return ""
+        logging.info(f"[{ctx.tenant_id}] Retrieval fallback for: {ctx.user_query} ({len(hits)} hits, top score {hits[0]['score']:.3f})")
+        messages = get_retrieval_answer_prompt(ctx.user_query, [hit["text"] for hit in hits], ctx.college)
+        response = complete("retrieval_answer", messages, temperature=0.3)
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        logging.error(f"[{ctx.tenant_id}] Retrieval fallback failed: {e}")
+        return ""
+
 def try_generate_and_execute(ctx: AssistantContext, db_path: str, max_retries: int = 3) -> str:
     for attempt in range(1, max_retries + 1):
         use_like = attempt > 1
@@ -173,21 +361,22 @@ def try_generate_and_execute(ctx: AssistantContext, db_path: str, max_retries: i
             generate_sql_query(ctx, db_path, use_like=use_like)
             result = execute_and_interpret(ctx, db_path)
 
-            logging.info(f"User Query: {ctx.user_query}")
-            logging.info(f"Selected Tables: {ctx.selected_tables}")
-            logging.info(f"Generated SQL: {ctx.generated_sql}")
-            logging.info(f"Result: {result}")
+            logging.info(f"[{ctx.tenant_id}] User Query: {ctx.user_query}")
+            logging.info(f"[{ctx.tenant_id}] Selected Tables: {ctx.selected_tables}")
+            logging.info(f"[{ctx.tenant_id}] Generated SQL: {ctx.generated_sql}")
+            logging.info(f"[{ctx.tenant_id}] Result: {result}")
 
             if "no matching data" in result.lower() or result.startswith("❌ No results found.") or "no data" in result.lower():
                 if attempt == max_retries:
                     return "❌ No data found after multiple attempts."
             elif result.startswith("❌ SQL execution error") or result.startswith("⚠️ Hmm, something went wrong"):
-                return result
+                # ✅ The generated SQL failed: answer from the cached records instead of only reporting the error
+                return answer_from_retrieval(ctx) or result
             else:
                 return result
         except Exception as e:
-            logging.error(f"Unexpected error during attempt {attempt}: {e}")
-            return (
+            logging.error(f"[{ctx.tenant_id}] Unexpected error during attempt {attempt}: {e}")
+            return answer_from_retrieval(ctx) or (
                 f"⚠️ An unexpected issue occurred while processing your request (attempt {attempt}).\n"
                 "Please try again shortly. If this continues to happen, consider reaching out to support for help."
             )
@@ -198,15 +387,9 @@ def try_generate_and_execute(ctx: AssistantContext, db_path: str, max_retries: i
         "You may want to rephrase your question or contact support for further help."
     )
 
-def detect_intent(user_query: str) -> str:
-    from mistral_helper import client, MODEL
-    messages = get_intent_prompt(user_query)
-    response = client.chat.complete(
-        model=MODEL,
-        messages=messages,
-        max_tokens=5,
-        temperature=0.0
-    )
+def detect_intent(user_query: str, college: str = DEFAULT_COLLEGE) -> str:
+    messages = get_intent_prompt(user_query, college)
+    response = complete("intent", messages, temperature=0.0)
     result = response.choices[0].message.content.strip().lower()
     return result if result in ["college", "general"] else "college"  # fallback
 
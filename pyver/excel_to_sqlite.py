@@ -2,6 +2,8 @@ import os
 import sqlite3
 import pandas as pd
 
+from summary_tables import build_summary_tables
+
 DB_NAME = "college_data.db"
 EXCEL_FOLDER = "./data"  # Folder containing your Excel files (.xlsx)
 
@@ -11,8 +13,16 @@ def clean_table_name(file_name):
     return base.strip().replace(" ", "_").replace("&", "and").replace("-", "_")
 
 def load_excel_to_sqlite(db_name, folder_path):
-    conn = sqlite3.connect(db_name)
-    print(f"📥 Connected to SQLite DB: {db_name}")
+    # Build into a temporary copy and swap it in at the end, so a running server never sees a half-imported DB
+    tmp_name = f"{db_name}.tmp"
+    if os.path.exists(tmp_name):
+        os.remove(tmp_name)
+    conn = sqlite3.connect(tmp_name)
+    if os.path.exists(db_name):
+        src = sqlite3.connect(db_name)
+        src.backup(conn)
+        src.close()
+    print(f"📥 Connected to SQLite DB: {db_name} (staging in {tmp_name})")
 
     for file in os.listdir(folder_path):
         if file.endswith(".xlsx"):
@@ -28,8 +38,15 @@ def load_excel_to_sqlite(db_name, folder_path):
             except Exception as e:
                 print(f"❌ Failed to load {file}: {e}")
 
+    build_summary_tables(conn)
+
+    # Bump the generation counter so running servers pick up the new data
+    generation = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+    conn.execute(f"PRAGMA user_version = {generation}")
+    conn.commit()
     conn.close()
-    print(f"🗃️ All files loaded into {db_name}")
+    os.replace(tmp_name, db_name)
+    print(f"🗃️ All files loaded into {db_name} (generation {generation})")
 
 if __name__ == "__main__":
     load_excel_to_sqlite(DB_NAME, EXCEL_FOLDER)
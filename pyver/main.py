@@ -3,11 +3,23 @@ from datetime import datetime, timedelta
 from fastapi import FastAPI
 import socketio
 import asyncio
-
-from dbagent import AssistantContext, get_all_tables, find_tables, try_generate_and_execute, detect_intent
-from mistral_helper import client, MODEL
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from dbagent import AssistantContext, find_tables, try_generate_and_execute, detect_intent, show_more_results
+from tenants import TenantRegistry, TenantPool
+from refinement import parse_refinement, refine_last_result
+from scheduler import PriorityExecutor, ExecutorBusy, FAST, COLLEGE, GENERAL
+from mistral_helper import complete, stage_stats
+from prompt_templates import DEFAULT_COLLEGE
 DB_PATH = "college_data.db"
-ALL_TABLES = get_all_tables(DB_PATH)
+
+# ✅ One process serves every college in tenants.json (default: CIET on DB_PATH).
+# Rerunning excel_to_sqlite.py for any of them is picked up without restarting the server.
+tenant_pool = TenantPool(TenantRegistry(DB_PATH))
+
+# ✅ Dedicated pool for SQL + LLM stages: cached/fast work first, college queries next, general chat last
+pipeline = PriorityExecutor(workers=8, max_queue=256)
 
 # Create Async Socket.IO server
 sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
@@ -21,18 +33,49 @@ socket_app = socketio.ASGIApp(sio, app)
 # Store user contexts (optional for multi-user support)
 user_contexts = {}
 
+BUSY_MESSAGE = "⏳ The assistant is handling many requests right now. Please try again in a moment."
+
+def make_preview_sender(sid):
+    loop = asyncio.get_running_loop()
+
+    def send(preview):
+        # ✅ Called from a pipeline worker thread; the emit itself must run on the event loop
+        asyncio.run_coroutine_threadsafe(sio.emit('bot-preview', preview, to=sid), loop)
+
+    return send
+
+@asynccontextmanager
+async def pinned_snapshot(tenant_id):
+    # ✅ Opening a cold tenant copies its whole database, so pin on the pipeline pool, never on the event loop
+    tenant, snapshot = await pipeline.run(FAST, tenant_pool.pin, tenant_id)
+    try:
+        yield snapshot
+    finally:
+        tenant_pool.unpin(tenant, snapshot)
+
+@app.get("/stats")
+async def stats():
+    return {"pipeline": pipeline.stats(), "tenants": tenant_pool.stats(), "stages": stage_stats()}
+
 @sio.event
 async def connect(sid, environ):
     ip = environ.get('REMOTE_ADDR') or environ.get('HTTP_X_REAL_IP') or 'Unknown'
-    print(f"Client connected: {sid}")
+    # Clients pick their college with ?tenant=<id> on the socket URL
+    tenant_id = parse_qs(environ.get('QUERY_STRING', '')).get('tenant', [None])[0]
+    tenant = tenant_pool.registry.resolve(tenant_id)
+    if tenant is None:
+        print(f"⚠️ Rejected {sid}: unknown tenant {tenant_id}")
+        raise ConnectionRefusedError(f"Unknown college '{tenant_id}'")
+    print(f"Client connected: {sid} (tenant: {tenant.tenant_id})")
     # Create a context for this user session
     user_contexts[sid] = {
         'context': AssistantContext(),
         'last_message_time': datetime.min,
         'ip': ip,  # Store IP for later
+        'tenant': tenant.tenant_id,
         'history':[]
     }
-    await sio.emit('bot-response', {'response': "👋 Welcome to CIET Assistant! What's your name?"}, to=sid)
+    await sio.emit('bot-response', {'response': f"👋 Welcome to {tenant.short_name} Assistant! What's your name?"}, to=sid)
 
 @sio.event
 async def disconnect(sid):
@@ -41,6 +84,7 @@ async def disconnect(sid):
 
 
 USER_LOG_FILE = "bot_users.txt"
+SHOW_MORE_MESSAGES = {"show more", "more", "next", "next page", "load more", "see more", "show next"}
 
 @sio.event
 async def register_user(sid, data):
@@ -48,13 +92,14 @@ async def register_user(sid, data):
     email = data.get("email", "").strip()
     timestamp = datetime.utcnow().isoformat()
     ip = user_contexts.get(sid, {}).get('ip', 'Unknown')
+    tenant_id = user_contexts.get(sid, {}).get('tenant', tenant_pool.registry.default_tenant)
 
 
     if not name or not email:
         print(f"⚠️ Invalid name or email from {sid}: {data}")
         return
 
-    user_info = f"{timestamp} | SID: {sid} | Name: {name} | Email: {email} | IP: {ip or 'N/A'}\n"
+    user_info = f"{timestamp} | Tenant: {tenant_id} | SID: {sid} | Name: {name} | Email: {email} | IP: {ip or 'N/A'}\n"
 
     try:
         with open(USER_LOG_FILE, "a", encoding="utf-8") as f:
@@ -67,7 +112,8 @@ async def register_user(sid, data):
 @sio.event
 async def chat_message(sid, data):
     user_message = data.get('message', '').strip()
-    print(f"Received from {sid}: {user_message}")
+    tenant_id = user_contexts.get(sid, {}).get('tenant', tenant_pool.registry.default_tenant)
+    print(f"Received from {sid} [{tenant_id}]: {user_message}")
 
     if not user_message:
         return
@@ -79,18 +125,14 @@ async def chat_message(sid, data):
             'context': AssistantContext(),
             'last_message_time': datetime.min,
             'ip': 'Unknown',
+            'tenant': tenant_pool.registry.default_tenant,
             'history': []
         }
         user_contexts[sid] = user_data
 
-    now = datetime.utcnow()
-    time_since_last = now - user_data['last_message_time']
-    if time_since_last < timedelta(seconds=1):
-        await sio.emit('bot-response', {'response': "⏳ Please wait a second before sending another message."}, to=sid)
+    if await throttled(sid, user_data):
         return
 
-    user_data['last_message_time'] = now
-
     # --- Context Setup ---
     history = user_data.get('history', [])
 
@@ -101,42 +143,57 @@ async def chat_message(sid, data):
     if len(history) > 10:
         history = history[-10:]
 
-    # Reset context and assign query + history
     ctx = user_data['context']
+    tenant = tenant_pool.registry.resolve(tenant_id)
+    # Progressive mode (default): rows are sent as 'bot-preview' right after SQL, the summary follows
+    progressive = data.get('progressive', True)
+    if ctx.result_cursor and user_message.lower().rstrip(".!") in SHOW_MORE_MESSAGES:
+        ctx.on_preview = make_preview_sender(sid) if progressive else None
+        ctx.tenant_id = tenant_id
+        ctx.college = tenant.display_name if tenant else DEFAULT_COLLEGE
+        history.append(await send_next_page(sid, user_data))
+        user_data['history'] = history
+        return
+
+    # Reset context and assign query + history (the last result is kept for follow-ups)
     ctx.reset()
     ctx.user_query = user_message
     ctx.history = history
+    ctx.tenant_id = tenant_id
+    ctx.college = tenant.display_name if tenant else DEFAULT_COLLEGE
+    ctx.vectorstore_path = tenant.vectorstore if tenant else None
+    ctx.on_preview = make_preview_sender(sid) if progressive else None
 
     await sio.emit('bot-typing', True, to=sid)
 
     try:
-        intent = detect_intent(user_message)
-
-        if intent == "college":
-            ctx.selected_tables = find_tables(ctx.user_query, ALL_TABLES)
-
-            if not ctx.selected_tables:
-                response = "Could not identify relevant tables for your query. Please try rephrasing."
+        response = None
+        refinement = parse_refinement(user_message) if ctx.last_result else None
+        if refinement:
+            # ✅ Follow-ups like "only CSE" reuse the previous result: one summary call instead of the full pipeline
+            async with pinned_snapshot(tenant_id) as snapshot:
+                ctx.db_generation = snapshot.generation
+                response = await pipeline.run(FAST, refine_last_result, ctx, refinement, snapshot.path)
+
+        if response is None:
+            intent = await pipeline.run(COLLEGE, detect_intent, user_message, ctx.college)
+
+            if intent == "college":
+                # Pin one snapshot for the whole query so a reload mid-flight cannot change the data under it
+                async with pinned_snapshot(tenant_id) as snapshot:
+                    ctx.db_generation = snapshot.generation
+                    ctx.selected_tables = await pipeline.run(COLLEGE, find_tables, ctx.user_query, snapshot.tables)
+
+                    if not ctx.selected_tables:
+                        response = "Could not identify relevant tables for your query. Please try rephrasing."
+                    else:
+                        response = await pipeline.run(COLLEGE, try_generate_and_execute, ctx, snapshot.path)
             else:
-                loop = asyncio.get_running_loop()
-                response = await loop.run_in_executor(None, try_generate_and_execute, ctx, DB_PATH)
-        else:
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a professional and knowledgeable assistant for college Chalapathi Institute of Engineering and Technology (CIET) trained to help students with general questions "
-                        "related to programming, IT companies, career paths, skill development, and technology. "
-                        "Answer clearly, concisely, and formally. Avoid emojis and casual phrases. "
-                        "Always aim to educate or guide respectfully."
-                    )
-                },
-                {"role": "user", "content": user_message}
-            ]
-
-            resp = client.chat.complete(model=MODEL, messages=messages, max_tokens=800, temperature=0.7)
-            response = resp.choices[0].message.content.strip()
+                ctx.last_result = None
+                response = await pipeline.run(GENERAL, answer_general_question, user_message, ctx.college)
 
+    except ExecutorBusy:
+        response = BUSY_MESSAGE
     except Exception as e:
         response = f"Error processing your query: {e}"
 
@@ -144,8 +201,75 @@ async def chat_message(sid, data):
     history.append(response)
     user_data['history'] = history
 
-    await sio.emit('bot-response', {'response': response}, to=sid)
+    await sio.emit('bot-response', {'response': response, 'has_more': ctx.result_cursor is not None}, to=sid)
+    await sio.emit('bot-typing', False, to=sid)
+
+
+def answer_general_question(user_message, college=DEFAULT_COLLEGE):
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                f"You are a professional and knowledgeable assistant for college {college} trained to help students with general questions "
+                "related to programming, IT companies, career paths, skill development, and technology. "
+                "Answer clearly, concisely, and formally. Avoid emojis and casual phrases. "
+                "Always aim to educate or guide respectfully."
+            )
+        },
+        {"role": "user", "content": user_message}
+    ]
+
+    resp = complete("general", messages, temperature=0.7)
+    return resp.choices[0].message.content.strip()
+
+
+async def throttled(sid, user_data):
+    # Same one-second limit for typed messages and the show_more event
+    now = datetime.utcnow()
+    if now - user_data['last_message_time'] < timedelta(seconds=1):
+        await sio.emit('bot-response', {'response': "⏳ Please wait a second before sending another message."}, to=sid)
+        return True
+    user_data['last_message_time'] = now
+    return False
+
+
+async def send_next_page(sid, user_data):
+    # ✅ Next page comes straight from SQLite; only the page summary needs the LLM
+    ctx = user_data['context']
+    await sio.emit('bot-typing', True, to=sid)
+    # One page at a time per session: concurrent fetches would read the same cursor offset
+    async with user_data.setdefault('page_lock', asyncio.Lock()):
+        try:
+            async with pinned_snapshot(user_data['tenant']) as snapshot:
+                ctx.db_generation = snapshot.generation
+                response = await pipeline.run(FAST, show_more_results, ctx, snapshot.path)
+        except ExecutorBusy:
+            response = BUSY_MESSAGE
+        except Exception as e:
+            response = f"Error loading more results: {e}"
+
+    await sio.emit('bot-response', {'response': response, 'has_more': ctx.result_cursor is not None}, to=sid)
     await sio.emit('bot-typing', False, to=sid)
+    return response
+
+
+@sio.event
+async def show_more(sid, data=None):
+    user_data = user_contexts.get(sid)
+    if not user_data or not user_data['context'].result_cursor:
+        await sio.emit('bot-response', {'response': "There are no further results to show.", 'has_more': False}, to=sid)
+        return
+    if await throttled(sid, user_data):
+        return
+
+    ctx = user_data['context']
+    ctx.on_preview = make_preview_sender(sid) if (data or {}).get('progressive', True) else None
+    # Same history handling as a typed "show more"
+    history = user_data.get('history', []) + ["show more"]
+    if len(history) > 10:
+        history = history[-10:]
+    history.append(await send_next_page(sid, user_data))
+    user_data['history'] = history
 
 
 # uvicorn main:socket_app --host 0.0.0.0 --port 3001 --reload
\ No newline at end of file
@@ -75,6 +75,8 @@
 
 
 import os
+import time
+import threading
 from mistralai import Mistral
 from dotenv import load_dotenv
 load_dotenv()
@@ -84,9 +86,106 @@ MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 if not MISTRAL_API_KEY:
     raise EnvironmentError("❌ Missing MISTRAL_API_KEY environment variable.")
 
-# ✅ Model used (you can adjust if needed)
-MODEL = "mistral-small-2506"
+# ✅ Models used (you can adjust if needed)
+MODEL = "mistral-small-2506"        # Generation-heavy stages
+FAST_MODEL = "ministral-8b-latest"  # Short classification-style stages, and the downgrade target
 
 # ✅ Initialize Mistral client
 print("[DEBUG] Initializing Mistral client...")
 client = Mistral(api_key=MISTRAL_API_KEY)
+
+
+class StageConfig:
+    def __init__(self, model: str, max_tokens: int, latency_target: float, timeout: float, fallback_model: str = FAST_MODEL):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.latency_target = latency_target  # Seconds; a slower moving average downgrades the stage
+        self.timeout = timeout  # Seconds before the client gives up on one call
+        self.fallback_model = fallback_model
+
+
+# ✅ Per-stage model, token budget, latency target and timeout
+STAGES = {
+    "intent": StageConfig(FAST_MODEL, 5, 0.8, 5.0),
+    "table_selection": StageConfig(FAST_MODEL, 50, 1.0, 8.0),
+    "sql_generation": StageConfig(MODEL, 512, 3.0, 20.0),
+    "no_result": StageConfig(FAST_MODEL, 200, 2.0, 10.0),
+    "result_summary": StageConfig(MODEL, 1000, 6.0, 30.0),
+    "retrieval_answer": StageConfig(MODEL, 600, 4.0, 20.0),
+    "general": StageConfig(MODEL, 800, 6.0, 30.0),
+}
+
+DOWNGRADE_COOLDOWN = 120.0  # Seconds on the fallback model before the primary is tried again
+LATENCY_ALPHA = 0.3         # Weight of the newest call in the moving average
+MIN_SAMPLES = 3             # Calls needed before a stage can be downgraded
+
+_stage_lock = threading.Lock()
+_stage_state = {
+    stage: {"ewma": None, "samples": 0, "calls": 0, "errors": 0, "downgrades": 0, "downgraded_until": 0.0}
+    for stage in STAGES
+}
+
+
+def stage_model(stage: str) -> str:
+    config = STAGES[stage]
+    with _stage_lock:
+        if time.monotonic() < _stage_state[stage]["downgraded_until"]:
+            return config.fallback_model
+    return config.model
+
+
+def _record_latency(stage: str, model: str, elapsed: float, failed: bool = False):
+    config = STAGES[stage]
+    if failed:
+        # Errors and timeouts count as a full timeout, so a failing model is downgraded like a slow one
+        elapsed = max(elapsed, config.timeout)
+    with _stage_lock:
+        state = _stage_state[stage]
+        state["calls"] += 1
+        if failed:
+            state["errors"] += 1
+        if model != config.model:
+            return  # Only the primary model's latency decides a downgrade
+        state["ewma"] = elapsed if state["ewma"] is None else LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * state["ewma"]
+        state["samples"] += 1
+        if (config.fallback_model != config.model and state["samples"] >= MIN_SAMPLES
+                and state["ewma"] > config.latency_target):
+            state["downgraded_until"] = time.monotonic() + DOWNGRADE_COOLDOWN
+            state["downgrades"] += 1
+            # Start fresh when the primary model is retried after the cooldown
+            state["ewma"] = None
+            state["samples"] = 0
+            print(f"[DEBUG] Stage {stage} over {config.latency_target}s target, using {config.fallback_model} for {DOWNGRADE_COOLDOWN:.0f}s")
+
+
+def complete(stage: str, messages: list, **kwargs):
+    """Chat completion for one pipeline stage, on that stage's model and token budget."""
+    config = STAGES[stage]
+    model = stage_model(stage)
+    kwargs.setdefault("max_tokens", config.max_tokens)
+    kwargs.setdefault("timeout_ms", int(config.timeout * 1000))
+    started_at = time.monotonic()
+    failed = True
+    try:
+        response = client.chat.complete(model=model, messages=messages, **kwargs)
+        failed = False
+        return response
+    finally:
+        _record_latency(stage, model, time.monotonic() - started_at, failed)
+
+
+def stage_stats() -> dict:
+    now = time.monotonic()
+    with _stage_lock:
+        return {
+            stage: {
+                "model": STAGES[stage].fallback_model if now < state["downgraded_until"] else STAGES[stage].model,
+                "latency_target_s": STAGES[stage].latency_target,
+                "timeout_s": STAGES[stage].timeout,
+                "avg_latency_s": round(state["ewma"], 3) if state["ewma"] is not None else None,
+                "calls": state["calls"],
+                "errors": state["errors"],
+                "downgrades": state["downgrades"],
+            }
+            for stage, state in _stage_state.items()
+        }
@@ -0,0 +1,85 @@
+import re
+from typing import List, Optional
+
+PREVIEW_ROWS = 10       # Rows shown before the summary arrives
+MAX_CELL_CHARS = 60
+
+EMAIL_PATTERN = re.compile(r"([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*([A-Za-z0-9])@([A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+PHONE_PATTERN = re.compile(r"(?<!\d)(\+?\d[\d\s-]{5,}\d)(?!\d)")
+CONTACT_COLUMN_PATTERN = re.compile(r"phone|mobile|contact|whatsapp|landline|fax|(?<![a-z])tel(?![a-z])", re.IGNORECASE)
+MIN_PHONE_DIGITS = 10          # Anywhere in the results
+MIN_CONTACT_PHONE_DIGITS = 7   # In contact columns, where landlines like "2524113" appear without an STD code
+
+
+def _mask_phone(match, min_digits: int) -> str:
+    digits = re.sub(r"\D", "", match.group(1))
+    if len(digits) < min_digits:
+        return match.group(1)
+    local = digits[-10:]
+    prefix = f"+{digits[:-10]} " if match.group(1).startswith("+") and len(digits) > 10 else ""
+    return f"{prefix}{local[:2]}{'*' * (len(local) - 4)}{local[-2:]}"
+
+
+def mask_value(value, column: str = "") -> str:
+    """Mask emails and phone numbers the same way the summary prompt asks the model to."""
+    if value is None:
+        return ""
+    text = str(value)
+    min_digits = MIN_CONTACT_PHONE_DIGITS if CONTACT_COLUMN_PATTERN.search(column) else MIN_PHONE_DIGITS
+    text = EMAIL_PATTERN.sub(lambda m: f"{m.group(1)}***{m.group(2)}@{m.group(3)}", text)
+    text = PHONE_PATTERN.sub(lambda m: _mask_phone(m, min_digits), text)
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 1] + "…"
+    return text
+
+
+def _to_number(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _fee_ratio_cells(col_names: List[str], row: tuple) -> dict:
+    # Management quota fees are shown as a multiple of the convener quota, never as a price
+    lowered = [col.lower() for col in col_names]
+    convener = next((i for i, col in enumerate(lowered) if "convener" in col and "ratio" not in col), None)
+    cells = {}
+    for i, col in enumerate(lowered):
+        if "management" not in col or "ratio" in col:
+            continue
+        base = _to_number(row[convener]) if convener is not None else None
+        amount = _to_number(row[i])
+        if base and amount is not None:
+            cells[i] = f"{amount / base:.1f}x convener"
+        else:
+            cells[i] = "—"
+    return cells
+
+
+def build_preview(col_names: List[str], rows: List[tuple], has_more: bool = False, max_rows: int = PREVIEW_ROWS) -> dict:
+    """Compact, masked table of result rows for the `bot-preview` event."""
+    shown = []
+    for row in rows[:max_rows]:
+        overrides = _fee_ratio_cells(col_names, row)
+        shown.append([overrides.get(i, mask_value(val, col_names[i])) for i, val in enumerate(row)])
+
+    headers = [col.replace("_", " ") for col in col_names]
+    lines = [
+        "| " + " | ".join(headers) + " |",
+        "| " + " | ".join("---" for _ in headers) + " |",
+    ]
+    for row in shown:
+        lines.append("| " + " | ".join(cell.replace("|", "/") for cell in row) + " |")
+
+    more = len(rows) > max_rows or has_more
+    if more:
+        lines.append("")
+        lines.append(f"_Showing the first {len(shown)} rows. A full answer follows._")
+
+    return {
+        "columns": col_names,
+        "rows": shown,
+        "truncated": more,
+        "markdown": "\n".join(lines),
+    }
@@ -1,5 +1,10 @@
 # prompt_templates.py
 
+from summary_tables import SUMMARY_TABLES
+
+# Used when no tenant is given; tenants pass their own TenantInfo.display_name
+DEFAULT_COLLEGE = "Chalapathi Institute of Engineering and Technology (CIET)"
+
 # def get_table_selection_prompt(user_query: str, available_tables: list) -> list:
 #     return [
 #         {
@@ -21,13 +26,13 @@
 #         }
 #     ]
 
-def get_intent_prompt(user_query: str) -> list:
+def get_intent_prompt(user_query: str, college: str = DEFAULT_COLLEGE) -> list:
     return [
         {
             "role": "system",
             "content": (
                 "You are an intent classification assistant. Your task is to decide whether the user's question is "
-                "about Chalapathi Institute of Engineering and Technology (CIET) - such as its departments, placements, "
+                f"about {college} - such as its departments, placements, "
                 "fees, hostel, transport, or faculty - or if it's a general technical/career-related question."
             )
         },
@@ -45,6 +50,13 @@ def get_intent_prompt(user_query: str) -> list:
 
 
 def get_table_selection_prompt(user_query: str, available_tables: list) -> list:
+    summaries = [name for name in SUMMARY_TABLES if name in available_tables]
+    summary_desc = (
+        "📊 Precomputed Summary Tables (prefer these for counts, totals, rankings, and ratios):\n"
+        + "".join(f"- {name}: {SUMMARY_TABLES[name]['description']}\n" for name in summaries)
+        + "\n"
+        if summaries else ""
+    )
     return [
         {
             "role": "system",
@@ -65,7 +77,7 @@ def get_table_selection_prompt(user_query: str, available_tables: list) -> list:
                 "- Placement: Students placed, their departments, companies, and year.\n"
                 "- Transport: Bus numbers, drivers, route stops, and timings.\n"
                 "- College_info: College profile including name, establishment year, location, programs, and contact info.\n\n"
-                
+                f"{summary_desc}"
                 "🔍 Task: Based on the user query, return the most relevant table name(s).\n"
                 "Respond using only valid table names from this list:\n"
                 f"{', '.join(available_tables)}\n\n"
@@ -116,12 +128,12 @@ def get_sql_generation_prompt(ctx, use_like: bool, extra_context="") -> list:
     ]
 
 
-def get_no_result_prompt(user_query: str) -> list:
+def get_no_result_prompt(user_query: str, college: str = DEFAULT_COLLEGE) -> list:
     return [
         {
             "role": "system",
             "content": (
-                "You are a professional assistant for Chalapathi Institute of Engineering and Technology (CIET). "
+                f"You are a professional assistant for {college}. "
                 "You interpret SQL results in a respectful, precise tone. If there is no data, explain that politely."
             )
         },
@@ -138,12 +150,18 @@ def get_no_result_prompt(user_query: str) -> list:
     ]
 
 
-def get_result_summary_prompt(user_query: str, col_names: list, rows: list, generated_sql: str) -> list:
+def get_result_summary_prompt(user_query: str, col_names: list, rows: list, generated_sql: str, has_more: bool = False,
+                              college: str = DEFAULT_COLLEGE) -> list:
+    more_hint = (
+        f"- These are only the first {len(rows)} matching rows; more are available. "
+        "Do not claim this is the complete list, and end by noting the user can say 'show more' to see the next results.\n"
+        if has_more else ""
+    )
     return [
         {
             "role": "system",
             "content": (
-                "You are a respectful and professional assistant for Chalapathi Institute of Engineering and Technology. "
+                f"You are a respectful and professional assistant for {college}. "
                 "You present query results with clarity, precision, and a formal tone appropriate for institutional communication."
             )
         },
@@ -154,7 +172,7 @@ def get_result_summary_prompt(user_query: str, col_names: list, rows: list, gene
                 f"Generated SQL is: {generated_sql}"
                 f"SQL Output:\nColumns: {col_names}\nRows: {rows}\n\n"
                 "AVOID EMAIL FORMAT ( you are a chatbot )"
-                "You are a polite, formal assistant for Chalapathi Institute of Engineering and Technology (CIET). "
+                f"You are a polite, formal assistant for {college}. "
                 "Present the answer clearly, respectfully, and with institutional tone.\n"
                 "- Use full names and titles when applicable.\n"
                 "- Avoid emojis, jokes, or casual remarks.\n"
@@ -162,6 +180,33 @@ def get_result_summary_prompt(user_query: str, col_names: list, rows: list, gene
                 "- if convener quota is 43,000 and management is 1,29,000. show management quota =  3 times of convener quota instead of management quota = 1,29,00"
                 "- If any emails or phone numbers are in the results, mask them (eg: +91 92******10, b***u@gmail.com)"
                 "- If the result is a list, present it with clarity and formality.\n"
+                f"{more_hint}"
+                "- Always assume this is for public display on an official college platform."
+            )
+        }
+    ]
+
+
+def get_retrieval_answer_prompt(user_query: str, passages: list, college: str = DEFAULT_COLLEGE) -> list:
+    records = "\n".join(f"- {p}" for p in passages)
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"You are a respectful and professional assistant for {college}. "
+                "You answer only from the records provided, with clarity, precision, and a formal tone."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"User Query: \"{user_query}\"\n\n"
+                f"Closest matching college records:\n{records}\n\n"
+                "AVOID EMAIL FORMAT ( you are a chatbot )"
+                "- Answer using only the records that are relevant to the query; ignore the rest.\n"
+                "- If none of the records answer the query, say politely that no matching data was found in the records.\n"
+                "- Avoid emojis, jokes, or casual remarks.\n"
+                "- If any emails or phone numbers are in the records, mask them (eg: +91 92******10, b***u@gmail.com)\n"
                 "- Always assume this is for public display on an official college platform."
             )
         }
@@ -0,0 +1,245 @@
+import re
+import difflib
+import sqlite3
+import logging
+from typing import List, Optional
+
+from mistral_helper import complete
+from dbagent import (
+    AssistantContext, CachedResult, ResultCursor, PAGE_SIZE, MAX_CACHED_ROWS,
+    send_preview, get_table_metadata, value_matches, result_sort_key, connect_results,
+)
+from prompt_templates import get_result_summary_prompt
+
+# Short follow-ups that narrow, swap or reorder the previous answer
+FILTER_PATTERN = re.compile(r"^(?:only|just|filter(?:\s+by)?|show\s+only)\s+(?P<term>.+)$", re.IGNORECASE)
+SWAP_PATTERN = re.compile(r"^(?:what|how)\s+about\s+(?P<term>.+)$", re.IGNORECASE)
+SORT_PATTERN = re.compile(
+    r"^(?:sort|order)\s+(?:it\s+|them\s+|the\s+results?\s+)?(?:by\s+)?(?P<term>.+?)"
+    r"(?:\s+(?P<direction>asc|ascending|desc|descending|highest\s+first|lowest\s+first))?$",
+    re.IGNORECASE,
+)
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+# `col = 'x'`, `t.col LIKE '%x%'` or `LOWER("col") = 'x'`; the column decides which values a swap may use
+STRING_LITERAL_PATTERN = re.compile(
+    r"(?P<column>(?:\w+\(\s*)?(?:\"[^\"]+\"|[A-Za-z_][\w.]*)(?:\s*\))?)\s*(?P<op>=|LIKE)\s*'(?P<value>[^']*)'",
+    re.IGNORECASE,
+)
+MAX_REFINEMENT_WORDS = 6
+
+
+class Refinement:
+    def __init__(self, kind: str, term: str, descending: bool = False):
+        self.kind = kind  # "filter", "swap" or "sort"
+        self.term = term
+        self.descending = descending
+
+    def __repr__(self):
+        return f"Refinement({self.kind!r}, {self.term!r}, descending={self.descending})"
+
+
+def parse_refinement(user_message: str) -> Optional[Refinement]:
+    text = user_message.strip().rstrip("?.!").strip()
+    text = re.sub(r"\s+please$", "", text, flags=re.IGNORECASE)
+    if not text or len(text.split()) > MAX_REFINEMENT_WORDS:
+        return None
+
+    match = SORT_PATTERN.match(text)
+    if match:
+        direction = (match.group("direction") or "").lower()
+        return Refinement("sort", match.group("term").strip(), descending=direction.startswith(("desc", "highest")))
+
+    match = SWAP_PATTERN.match(text)
+    if match:
+        return Refinement("swap", match.group("term").strip())
+
+    match = FILTER_PATTERN.match(text)
+    if match:
+        return Refinement("filter", match.group("term").strip())
+    return None
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _match_column(term: str, col_names: List[str]) -> Optional[str]:
+    wanted = _normalize(term)
+    if not wanted:
+        return None
+    normalized = {_normalize(col): col for col in col_names}
+    for norm, col in normalized.items():
+        if wanted in norm or (norm and norm in wanted):
+            return col
+    close = difflib.get_close_matches(wanted, normalized.keys(), n=1, cutoff=0.6)
+    return normalized[close[0]] if close else None
+
+
+def _literal_column(expression: str) -> str:
+    # LOWER("p"."DEPARTMENT") -> DEPARTMENT
+    name = re.sub(r"^\w+\(\s*|\s*\)$", "", expression.strip())
+    return name.split(".")[-1].strip('"')
+
+
+def _find_column_value(db_path: str, tables: List[str], column: str, term: str, partial: bool) -> Optional[str]:
+    """Return the stored spelling of `term` if it is a value of `column` in one of `tables`."""
+    for table in tables:
+        _, _, headers = get_table_metadata(db_path, table)
+        match = next((col for col in headers if col.lower() == column.lower()), None)
+        if not match:
+            continue
+        with sqlite3.connect(db_path) as conn:
+            if partial:
+                row = conn.execute(
+                    f'SELECT "{match}" FROM "{table}" WHERE LOWER(CAST("{match}" AS TEXT)) LIKE ? LIMIT 1',
+                    (f"%{term.lower()}%",),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f'SELECT "{match}" FROM "{table}" WHERE LOWER(TRIM(CAST("{match}" AS TEXT))) = ? LIMIT 1',
+                    (term.lower(),),
+                ).fetchone()
+        if row:
+            return term if partial else str(row[0]).strip()
+    return None
+
+
+def _swap_literal(sql: str, term: str, cached: CachedResult, db_path: str) -> Optional[str]:
+    """
+    Re-parameterize the previous SQL by replacing its single year or string filter.
+    The new value must be a year or an existing value of the filtered column,
+    so "what about the hostel fees" is not mistaken for a department.
+    """
+    if YEAR_PATTERN.fullmatch(term):
+        years = set(YEAR_PATTERN.findall(sql))
+        if len(years) == 1:
+            return YEAR_PATTERN.sub(term, sql)
+        return None
+
+    literals = list(STRING_LITERAL_PATTERN.finditer(sql))
+    if len({m.group("value") for m in literals}) != 1:
+        return None
+    old_value = literals[0].group("value")
+    partial = old_value.startswith("%") and old_value.endswith("%") and len(old_value) > 1
+    column = _literal_column(literals[0].group("column"))
+
+    value = _find_column_value(db_path, cached.tables, column, term, partial)
+    if value is None:
+        return None
+
+    wrapper = literals[0].group("column").split("(")[0].strip().lower() if "(" in literals[0].group("column") else ""
+    if wrapper == "lower":
+        value = value.lower()
+    elif wrapper == "upper":
+        value = value.upper()
+    new_value = value.replace("'", "''")
+    if partial:
+        new_value = f"%{new_value}%"
+    return STRING_LITERAL_PATTERN.sub(lambda m: f"{m.group('column')} {m.group('op')} '{new_value}'", sql)
+
+
+def _build_refined_sql(cached: CachedResult, refinement: Refinement, column: Optional[str]) -> str:
+    """
+    Return SQL equivalent to applying the refinement on top of the cached SQL. It uses the
+    functions from connect_results(), so it matches and orders rows exactly like the in-memory path.
+    """
+    if refinement.kind == "sort":
+        direction = "DESC" if refinement.descending else "ASC"
+        order = ", ".join(f'{fn}("{column}") {direction}' for fn in ("SORT_RANK", "SORT_NUM", "SORT_TEXT"))
+        return f"SELECT * FROM ({cached.sql}) ORDER BY {order}"
+
+    # Literal is inlined (quotes escaped) so the result can be wrapped again by the next refinement
+    term = "'" + refinement.term.replace("'", "''") + "'"
+    conditions = " OR ".join(f'REFINE_MATCH("{col}", {term})' for col in cached.col_names)
+    return f"SELECT * FROM ({cached.sql}) WHERE {conditions}"
+
+
+def _filter_rows(rows: List[tuple], term: str) -> List[tuple]:
+    return [row for row in rows if any(value_matches(val, term) for val in row)]
+
+
+def _run_sql(db_path: str, sql: str):
+    conn = connect_results(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        # One row past the cache limit is enough to mark the result incomplete
+        rows = cursor.fetchmany(MAX_CACHED_ROWS + 1)
+        col_names = [desc[0] for desc in cursor.description]
+    finally:
+        conn.close()
+    return col_names, rows
+
+
+def refine_last_result(ctx: AssistantContext, refinement: Refinement, db_path: str) -> Optional[str]:
+    """
+    Answer a follow-up from the cached result of the previous query.
+
+    Rows are filtered or sorted in memory when the cache holds the full result,
+    otherwise the previous SQL is wrapped or re-parameterized and rerun. Only the
+    final summary needs an LLM call. Returns None when the refinement does not
+    apply or matches no rows, so the caller can fall back to the full pipeline.
+    """
+    cached = ctx.last_result
+    if not cached or not cached.col_names:
+        return None
+
+    col_names, rows = cached.col_names, None
+    # Cached rows from an older snapshot are only used to validate the term; results are rerun
+    in_memory = cached.complete and cached.generation == ctx.db_generation
+
+    try:
+        if refinement.kind == "sort":
+            column = _match_column(refinement.term, cached.col_names)
+            if not column:
+                return None
+            sql = _build_refined_sql(cached, refinement, column)
+            if in_memory:
+                index = cached.col_names.index(column)
+                rows = sorted(cached.rows, key=lambda row: result_sort_key(row[index]), reverse=refinement.descending)
+
+        elif refinement.kind == "swap":
+            sql = _swap_literal(cached.sql, refinement.term, cached, db_path)
+            if sql:
+                col_names, rows = _run_sql(db_path, sql)
+            else:
+                # Nothing to swap, treat "what about X" as narrowing the previous answer
+                refinement = Refinement("filter", refinement.term)
+
+        if refinement.kind == "filter":
+            # Only narrow on something the previous answer actually contains. A partial cache
+            # is checked by running the filter; no rows there also hands back to the pipeline
+            matched = _filter_rows(cached.rows, refinement.term)
+            if not matched and cached.complete:
+                return None
+            sql = _build_refined_sql(cached, refinement, None)
+            if in_memory:
+                rows = matched
+
+        if rows is None:
+            col_names, rows = _run_sql(db_path, sql)
+    except sqlite3.Error as e:
+        logging.error(f"[{ctx.tenant_id}] Refinement failed, falling back to full pipeline: {e}")
+        return None
+
+    if not rows:
+        # Probably a new question phrased like a follow-up; let the full pipeline answer it
+        return None
+
+    ctx.user_query = f"{cached.question} ({refinement.kind}: {refinement.term})"
+    ctx.selected_tables = cached.tables
+    ctx.generated_sql = sql
+    ctx.last_result = CachedResult(ctx.user_query, cached.tables, sql, col_names, rows, generation=ctx.db_generation)
+
+    has_more = len(rows) > PAGE_SIZE
+    if has_more:
+        ctx.result_cursor = ResultCursor(ctx.user_query, sql, col_names, offset=PAGE_SIZE, generation=ctx.db_generation)
+        rows = rows[:PAGE_SIZE]
+
+    logging.info(f"[{ctx.tenant_id}] Refined Query: {ctx.user_query}")
+    logging.info(f"[{ctx.tenant_id}] Refined SQL: {sql}")
+
+    send_preview(ctx, col_names, rows, has_more)
+    messages = get_result_summary_prompt(ctx.user_query, col_names, rows, sql, has_more=has_more, college=ctx.college)
+    response = complete("result_summary", messages, temperature=0.3)
+    return response.choices[0].message.content.strip()
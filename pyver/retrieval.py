@@ -0,0 +1,270 @@
+import os
+import re
+import json
+import zlib
+import logging
+import threading
+import urllib.request
+from typing import List, Optional
+
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
+VECTORSTORE_PATH = os.path.join(CACHE_DIR, "vectorstore.json")
+CATEGORY_ALIAS_PATH = os.path.join(CACHE_DIR, "category_alias_embeddings.json")
+
+# Document types in vectorstore.json for each SQLite table
+TABLE_DOC_TYPES = {
+    "faculty_data": "faculty",
+    "placement": "placement",
+    "transport": "transport",
+    "lab_infrastructure": "lab",
+    "fee_structure": "fees",
+    "intake_capacity": "intake",
+    "boyshostel_structure": "hostel",
+    "girlshostel_structure": "hostel",
+}
+
+# Alias categories (category_alias_embeddings.json) use slightly different names
+CATEGORY_DOC_TYPES = {
+    "fees": "fees",
+    "lab infrastructure": "lab",
+    "intake capacity": "intake",
+}
+
+
+# Words too common in questions to count as evidence that a record matches
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "for", "on", "at", "by", "and", "or", "is", "are", "was", "were",
+    "who", "what", "which", "when", "where", "how", "many", "much", "me", "my", "about", "tell", "give",
+    "show", "list", "all", "from", "with", "there", "any", "do", "does", "i", "you", "it", "this", "that",
+}
+MAX_TERM_DF = 0.15  # Words in more than this share of records (dept, professor, placed, 2025) are not distinctive
+
+
+def _terms(text: str) -> set:
+    # Crude plural folding so "labs" matches "Lab" and "fees" matches "Fee"
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in re.findall(r"[a-z0-9]+", text.lower())}
+
+
+class HashingEmbedder:
+    """Local stand-in embedder: signed feature hashing of words and character trigrams."""
+
+    name = "hashing"
+    # Cosine alone does not separate relevant records (0.15-0.52 on sample questions) from unrelated
+    # ones (0.20-0.36), so hits must also share a distinctive query word; the floor only drops noise
+    min_score = 0.1
+    term_overlap = True
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        features = list(words)
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return vectors
+
+
+class OllamaEmbedder:
+    """nomic-embed-text through a local Ollama server, the same model the Node server cached."""
+
+    name = "nomic-embed-text"
+    dim = 768
+    min_score = 0.75
+    term_overlap = False
+
+    def __init__(self, url: str = "http://localhost:11434/api/embeddings", timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            body = json.dumps({"model": self.name, "prompt": text}).encode("utf-8")
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=self.timeout) as res:
+                vectors[row] = json.loads(res.read())["embedding"]
+        return vectors
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "ollama": OllamaEmbedder,
+}
+
+
+def get_embedder(name: Optional[str] = None):
+    name = name or os.getenv("CIET_EMBEDDER", "hashing")
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{name}'. Choose one of: {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name]()
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Row-normalized float32 matrix, memory-mapped from a .npy file next to its JSON source.
+
+    The .npy is rebuilt when the JSON is newer or was embedded by a different
+    embedder. Stored vectors are reused when their size matches the embedder;
+    otherwise the texts are embedded once and cached.
+    """
+
+    def __init__(self, source_path: str, texts: List[str], labels: List[str], payloads: List[dict],
+                 embedder, stored_vectors: Optional[List[list]] = None):
+        self.source_path = source_path
+        self.texts = texts
+        self.labels = np.array(labels)
+        self.payloads = payloads
+        self.embedder = embedder
+        self.matrix = self._load_or_build(stored_vectors)
+        self.doc_terms = [_terms(text) for text in texts]
+        self.term_df = Counter(term for terms in self.doc_terms for term in terms)
+
+    @property
+    def matrix_path(self) -> str:
+        base = os.path.splitext(self.source_path)[0]
+        return f"{base}.{self.embedder.name}.npy"
+
+    def _load_or_build(self, stored_vectors) -> np.ndarray:
+        path = self.matrix_path
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self.source_path):
+            matrix = np.load(path, mmap_mode="r")
+            if matrix.shape == (len(self.texts), self.embedder.dim):
+                return matrix
+
+        if stored_vectors and all(v and len(v) == self.embedder.dim for v in stored_vectors) and self.embedder.name == OllamaEmbedder.name:
+            matrix = np.asarray(stored_vectors, dtype=np.float32)
+        else:
+            print(f"[DEBUG] Embedding {len(self.texts)} texts from {os.path.basename(self.source_path)} with {self.embedder.name}")
+            matrix = self.embedder.embed(self.texts)
+
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, _normalize_rows(matrix))
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r")
+
+    def search(self, query: str, k: int = 5, labels: Optional[List[str]] = None, min_score: Optional[float] = None) -> List[dict]:
+        query_vec = _normalize_rows(self.embedder.embed([query]))[0]
+        scores = self.matrix @ query_vec
+
+        if labels:
+            scores = np.where(np.isin(self.labels, labels), scores, -np.inf)
+
+        overlap = getattr(self.embedder, "term_overlap", False)
+        # Overlap filtering drops hits, so rank a wider candidate pool first
+        pool = min(k * 4 if overlap else k, len(scores))
+        if pool == 0:
+            return []
+        top = np.argpartition(-scores, pool - 1)[:pool]
+        top = top[np.argsort(-scores[top])]
+
+        threshold = self.embedder.min_score if min_score is None else min_score
+        top = [i for i in top if scores[i] >= threshold]
+
+        if overlap:
+            limit = MAX_TERM_DF * len(self.texts)
+            wanted = {term for term in _terms(query) - STOPWORDS if self.term_df[term] <= limit}
+            matched = {i: len(wanted & self.doc_terms[i]) for i in top}
+            best = max(matched.values(), default=0)
+            # Keep only the records that match the most distinctive words; none at all means no answer
+            top = [i for i in top if best and matched[i] == best]
+
+        return [
+            {"text": self.texts[i], "label": str(self.labels[i]), "score": float(scores[i]), "payload": self.payloads[i]}
+            for i in top[:k]
+        ]
+
+
+def load_document_index(embedder, path: str = VECTORSTORE_PATH) -> VectorIndex:
+    with open(path, encoding="utf-8") as f:
+        docs = json.load(f)
+    return VectorIndex(
+        path,
+        texts=[doc["text"] for doc in docs],
+        labels=[doc.get("metadata", {}).get("type", "") for doc in docs],
+        payloads=[doc.get("metadata", {}) for doc in docs],
+        embedder=embedder,
+        stored_vectors=[doc.get("embedding") for doc in docs],
+    )
+
+
+def load_category_index(embedder, path: str = CATEGORY_ALIAS_PATH) -> VectorIndex:
+    with open(path, encoding="utf-8") as f:
+        aliases = json.load(f)
+    return VectorIndex(
+        path,
+        texts=[alias["phrase"] for alias in aliases],
+        labels=[CATEGORY_DOC_TYPES.get(alias["category"], alias["category"]) for alias in aliases],
+        payloads=[{"category": alias["category"]} for alias in aliases],
+        embedder=embedder,
+        stored_vectors=[alias.get("embedding") for alias in aliases],
+    )
+
+
+class Retriever:
+    def __init__(self, embedder=None, vectorstore_path: str = VECTORSTORE_PATH):
+        self.embedder = embedder or get_embedder()
+        self.documents = load_document_index(self.embedder, vectorstore_path)
+        self.categories = load_category_index(self.embedder)
+
+    def detect_category(self, query: str) -> Optional[str]:
+        hits = self.categories.search(query, k=1)
+        return hits[0]["label"] if hits else None
+
+    def search(self, query: str, tables: Optional[List[str]] = None, k: int = 8) -> List[dict]:
+        doc_types = sorted({TABLE_DOC_TYPES[t] for t in tables or [] if t in TABLE_DOC_TYPES})
+        if not doc_types:
+            category = self.detect_category(query)
+            doc_types = [category] if category else []
+        return self.documents.search(query, k=k, labels=doc_types or None)
+
+
+MAX_RETRIEVERS = 16  # Same bound as tenants.MAX_OPEN_TENANTS; one vector store per open college
+
+_retrievers: "OrderedDict[str, Retriever]" = OrderedDict()
+_retriever_lock = threading.Lock()
+
+
+def get_retriever(vectorstore_path: str = VECTORSTORE_PATH) -> Optional[Retriever]:
+    """Shared retriever per vector store, built on first use. Returns None if the cache files cannot be loaded."""
+    with _retriever_lock:
+        retriever = _retrievers.get(vectorstore_path)
+        if retriever is None:
+            try:
+                retriever = Retriever(vectorstore_path=vectorstore_path)
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Vector retrieval unavailable for {vectorstore_path}: {e}")
+                return None
+            _retrievers[vectorstore_path] = retriever
+        _retrievers.move_to_end(vectorstore_path)
+        while len(_retrievers) > MAX_RETRIEVERS:
+            # Queries already holding an evicted retriever keep using it until they finish
+            _retrievers.popitem(last=False)
+        return retriever
+
+
+def drop_retriever(vectorstore_path: Optional[str]):
+    """Forget the cached retriever for a vector store (e.g. its tenant was closed)."""
+    if not vectorstore_path:
+        return
+    with _retriever_lock:
+        _retrievers.pop(vectorstore_path, None)
@@ -0,0 +1,147 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+# Priority classes: lower runs first
+FAST = 0      # Cached results, refinements, "show more" pages
+COLLEGE = 1   # Intent, table selection, SQL generation and summaries
+GENERAL = 2   # Long general-knowledge answers
+PRIORITY_NAMES = {FAST: "fast", COLLEGE: "college", GENERAL: "general"}
+
+RESERVED_WORKERS = 2     # Never taken by GENERAL work, so college lookups always find a free worker
+MAX_GENERAL_WAIT = 15.0  # Seconds; an older GENERAL job runs before newer higher-priority work
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when the queue is full; callers should ask the user to retry."""
+
+
+class PriorityExecutor:
+    """
+    Fixed pool of worker threads fed from one FIFO queue per priority class.
+
+    Replaces the default `run_in_executor(None, ...)` pool for pipeline work.
+    Idle workers take FAST, then COLLEGE, then GENERAL work. GENERAL jobs may
+    occupy at most `workers - reserved` threads, so a burst of slow general
+    answers cannot hold every worker. A GENERAL job that has waited
+    `max_general_wait` seconds jumps the queue, so sustained college load
+    cannot starve it.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 256, name: str = "pipeline",
+                 reserved: int = RESERVED_WORKERS, max_general_wait: float = MAX_GENERAL_WAIT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.general_limit = max(1, workers - reserved)
+        self.max_general_wait = max_general_wait
+        self._queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self._cond = threading.Condition()
+        self._running = {priority: 0 for priority in PRIORITY_NAMES}
+        self._shutdown = False
+        self._stats = {
+            priority: {"submitted": 0, "started": 0, "completed": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0, "run_total": 0.0}
+            for priority in PRIORITY_NAMES
+        }
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, priority: int, fn, *args) -> Future:
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Executor has been shut down")
+            if self._queued() >= self.max_queue:
+                self._stats[priority]["rejected"] += 1
+                raise ExecutorBusy(f"Pipeline queue is full ({self.max_queue} waiting)")
+            self._queues[priority].append((time.monotonic(), fn, args, future))
+            self._stats[priority]["submitted"] += 1
+            self._cond.notify()
+        return future
+
+    async def run(self, priority: int, fn, *args):
+        """Await `fn(*args)` on the pool at the given priority."""
+        return await asyncio.wrap_future(self.submit(priority, fn, *args))
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_priority(self):
+        # Caller must hold self._cond
+        general = self._queues[GENERAL]
+        general_allowed = bool(general) and self._running[GENERAL] < self.general_limit
+        if general_allowed and time.monotonic() - general[0][0] >= self.max_general_wait:
+            return GENERAL
+        for priority in (FAST, COLLEGE):
+            if self._queues[priority]:
+                return priority
+        return GENERAL if general_allowed else None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                priority = self._next_priority()
+                while priority is None and not self._shutdown:
+                    self._cond.wait()
+                    priority = self._next_priority()
+                if priority is None:
+                    return
+                enqueued_at, fn, args, future = self._queues[priority].popleft()
+                waited = time.monotonic() - enqueued_at
+                stats = self._stats[priority]
+                stats["started"] += 1
+                stats["wait_total"] += waited
+                stats["wait_max"] = max(stats["wait_max"], waited)
+                self._running[priority] += 1
+
+            started_at = time.monotonic()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    stats["completed"] += 1
+                    stats["run_total"] += time.monotonic() - started_at
+                    if priority == GENERAL:
+                        # A GENERAL slot opened up; a worker may be idle only because of the cap
+                        self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            classes = {}
+            for priority, stats in self._stats.items():
+                classes[PRIORITY_NAMES[priority]] = {
+                    "submitted": stats["submitted"],
+                    "completed": stats["completed"],
+                    "rejected": stats["rejected"],
+                    "queued": len(self._queues[priority]),
+                    "running": self._running[priority],
+                    "avg_wait_ms": round(stats["wait_total"] / (stats["started"] or 1) * 1000, 1),
+                    "max_wait_ms": round(stats["wait_max"] * 1000, 1),
+                    "avg_run_ms": round(stats["run_total"] / (stats["completed"] or 1) * 1000, 1),
+                }
+            return {
+                "workers": self.workers,
+                "general_limit": self.general_limit,
+                "running": sum(self._running.values()),
+                "queue_depth": self._queued(),
+                "max_queue": self.max_queue,
+                "classes": classes,
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
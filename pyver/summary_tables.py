@@ -0,0 +1,139 @@
+import sqlite3
+from typing import List
+
+# Aggregates precomputed at ingest time, so common "how many / total / top" questions
+# become a lookup instead of a model-written GROUP BY.
+# name -> source tables, SELECT that builds it, indexed columns, description for table selection
+SUMMARY_TABLES = {
+    "summary_placements_by_department": {
+        "sources": ["placement"],
+        "sql": """
+            SELECT DEPARTMENT, YEAR,
+                   COUNT(*) AS Students_Placed,
+                   COUNT(DISTINCT COMPANY) AS Companies
+            FROM placement
+            GROUP BY DEPARTMENT, YEAR
+        """,
+        "index": ["DEPARTMENT", "YEAR"],
+        "description": "Placement counts per department and year (students placed, number of companies).",
+    },
+    "summary_top_recruiters": {
+        "sources": ["placement"],
+        "sql": """
+            SELECT COMPANY,
+                   COUNT(*) AS Students_Placed,
+                   COUNT(DISTINCT DEPARTMENT) AS Departments,
+                   GROUP_CONCAT(DISTINCT DEPARTMENT) AS Department_List,
+                   MIN(YEAR) AS First_Year,
+                   MAX(YEAR) AS Last_Year
+            FROM placement
+            GROUP BY COMPANY
+            ORDER BY Students_Placed DESC
+        """,
+        "index": ["COMPANY", "Students_Placed"],
+        "description": "Recruiting companies ranked by students placed, with departments hired from.",
+    },
+    "summary_hostel_capacity": {
+        "sources": ["boyshostel_structure", "girlshostel_structure"],
+        "sql": """
+            SELECT Hostel_Type, Academic_Year,
+                   COUNT(*) AS Hostels,
+                   SUM(Total_Rooms) AS Total_Rooms,
+                   SUM(Total_Rooms * Capacity_per_Room) AS Total_Beds,
+                   MIN(Annual_Fee) AS Min_Annual_Fee,
+                   MAX(Annual_Fee) AS Max_Annual_Fee
+            FROM (
+                SELECT 'Boys' AS Hostel_Type, Academic_Year, Total_Rooms, Capacity_per_Room, "Annual_Fee_(₹)" AS Annual_Fee
+                FROM boyshostel_structure
+                UNION ALL
+                SELECT 'Girls', Academic_Year, Total_Rooms, Capacity_per_Room, "Annual_Fee_(₹)"
+                FROM girlshostel_structure
+            )
+            GROUP BY Hostel_Type, Academic_Year
+        """,
+        "index": ["Hostel_Type", "Academic_Year"],
+        "description": "Total hostels, rooms, beds and fee range for boys and girls hostels per academic year.",
+    },
+    "summary_fee_ratios": {
+        "sources": ["fee_structure"],
+        "sql": """
+            SELECT Specialization,
+                   Convener_Fee,
+                   Management_Fee,
+                   ROUND(CAST(Management_Fee AS REAL) / NULLIF(Convener_Fee, 0), 2) AS Management_to_Convener_Ratio
+            FROM (
+                SELECT Specialization,
+                       CAST(REPLACE("Convener_Quota_(₹)", ',', '') AS INTEGER) AS Convener_Fee,
+                       CAST(REPLACE("Management_Quota_(₹)", ',', '') AS INTEGER) AS Management_Fee
+                FROM fee_structure
+            )
+        """,
+        "index": ["Specialization"],
+        "description": "Convener and management quota fees per specialization as numbers, with the management-to-convener ratio.",
+    },
+    "summary_lab_systems": {
+        "sources": ["lab_infrastructure"],
+        "sql": """
+            SELECT DEPARTMENT, ACADEMIC_YEAR,
+                   COUNT(*) AS Labs,
+                   -- Some rows hold course text instead of a count; those must stay NULL, not become 0
+                   SUM(CASE WHEN TRIM("NO.OF_SYSTEMS") <> '' AND TRIM("NO.OF_SYSTEMS") NOT GLOB '*[^0-9]*'
+                            THEN CAST(TRIM("NO.OF_SYSTEMS") AS INTEGER) END) AS Total_Systems
+            FROM lab_infrastructure
+            GROUP BY DEPARTMENT, ACADEMIC_YEAR
+        """,
+        "index": ["DEPARTMENT", "ACADEMIC_YEAR"],
+        "description": "Number of labs and total computer systems per department and academic year (NULL where no system count is recorded).",
+    },
+    "summary_intake": {
+        "sources": ["intake_capacity"],
+        "sql": """
+            SELECT Academic_Year,
+                   COUNT(*) AS Departments,
+                   SUM("Intake_Capacity/No.of_Seats") AS Total_Intake,
+                   MAX("Intake_Capacity/No.of_Seats") AS Largest_Department_Intake
+            FROM intake_capacity
+            GROUP BY Academic_Year
+        """,
+        "index": ["Academic_Year"],
+        "description": "Total seats across all departments per academic year.",
+    },
+}
+
+
+def build_summary_tables(conn: sqlite3.Connection) -> List[str]:
+    """(Re)build every summary table whose source tables exist. Returns the names built."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    built = []
+
+    for name, spec in SUMMARY_TABLES.items():
+        conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+        missing = [src for src in spec["sources"] if src not in existing]
+        if missing:
+            print(f"⏭️ Skipped summary {name}: missing {', '.join(missing)}")
+            continue
+        try:
+            conn.execute(f'CREATE TABLE "{name}" AS {spec["sql"]}')
+            for column in spec["index"]:
+                conn.execute(f'CREATE INDEX "idx_{name}_{column.lower()}" ON "{name}" ("{column}")')
+            count = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            print(f"📊 Built summary: {name} ({count} rows)")
+            built.append(name)
+        except sqlite3.Error as e:
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            print(f"❌ Failed to build summary {name}: {e}")
+
+    conn.commit()
+    return built
+
+
+if __name__ == "__main__":
+    # Refresh the summaries of an existing database without re-importing the Excel files
+    import sys
+    db_name = sys.argv[1] if len(sys.argv) > 1 else "college_data.db"
+    conn = sqlite3.connect(db_name)
+    build_summary_tables(conn)
+    generation = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+    conn.execute(f"PRAGMA user_version = {generation}")
+    conn.commit()
+    conn.close()
@@ -0,0 +1,220 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from db_snapshot import DBSnapshot, SnapshotManager, SNAPSHOT_DIR
+from retrieval import VECTORSTORE_PATH, drop_retriever
+
+TENANTS_FILE = "tenants.json"
+DEFAULT_TENANT = "ciet"
+DEFAULT_COLLEGE_NAME = "Chalapathi Institute of Engineering and Technology"
+MAX_OPEN_TENANTS = 16
+
+
+class TenantInfo:
+    def __init__(self, tenant_id: str, db_path: str, name: str, short_name: str = "", vectorstore: Optional[str] = None):
+        self.tenant_id = tenant_id
+        self.db_path = db_path
+        self.name = name
+        self.short_name = short_name or tenant_id.upper()
+        self.vectorstore = vectorstore  # Records for the retrieval fallback; None disables it
+
+    @property
+    def display_name(self) -> str:
+        """Name used in prompts, e.g. "Chalapathi Institute of Engineering and Technology (CIET)"."""
+        return f"{self.name} ({self.short_name})"
+
+
+class TenantRegistry:
+    """
+    Maps a tenant id (sent by the client as `?tenant=<id>`) to its college database.
+
+    `tenants.json` looks like:
+        {"ciet": {"name": "Chalapathi Institute ...", "short_name": "CIET", "db_path": "college_data.db"},
+         "cit":  {"name": "...", "db_path": "tenants/cit/college_data.db", "vectorstore": "tenants/cit/vectorstore.json"}}
+    The file is re-read when it changes, so colleges can be added without a restart.
+    Without the file only the default tenant exists.
+    """
+
+    def __init__(self, default_db_path: str, registry_path: str = TENANTS_FILE, default_tenant: str = DEFAULT_TENANT):
+        self.default_db_path = default_db_path
+        self.registry_path = registry_path
+        self.default_tenant = default_tenant
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._tenants: Dict[str, TenantInfo] = {}
+        self._load()
+
+    def _load(self):
+        tenants = {
+            self.default_tenant: TenantInfo(self.default_tenant, self.default_db_path, DEFAULT_COLLEGE_NAME, "CIET", VECTORSTORE_PATH)
+        }
+        try:
+            mtime = os.path.getmtime(self.registry_path)
+        except OSError:
+            mtime = None
+
+        if mtime is not None:
+            try:
+                with open(self.registry_path, encoding="utf-8") as f:
+                    for tenant_id, entry in json.load(f).items():
+                        tenants[tenant_id] = TenantInfo(
+                            tenant_id, entry["db_path"], entry.get("name", tenant_id),
+                            entry.get("short_name", ""),
+                            entry.get("vectorstore", VECTORSTORE_PATH if tenant_id == self.default_tenant else None),
+                        )
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                # Keep the last good registry rather than dropping every tenant
+                logging.error(f"Invalid tenant registry {self.registry_path}: {e}")
+                if self._tenants:
+                    return
+
+        self._tenants = tenants
+        self._mtime = mtime
+
+    def resolve(self, tenant_id: Optional[str] = None) -> Optional[TenantInfo]:
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.registry_path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._load()
+            return self._tenants.get(tenant_id or self.default_tenant)
+
+
+class Tenant:
+    """An open tenant: its snapshot manager plus per-tenant metadata."""
+
+    def __init__(self, info: TenantInfo, snapshots: SnapshotManager):
+        self.info = info
+        self.snapshots = snapshots
+        self.active = 0  # Queries currently running; busy tenants are never evicted
+
+
+class TenantPool:
+    """LRU of open tenant databases, bounded to `max_open` idle tenants."""
+
+    def __init__(self, registry: TenantRegistry, max_open: int = MAX_OPEN_TENANTS, snapshot_root: str = SNAPSHOT_DIR):
+        self.registry = registry
+        self.max_open = max_open
+        self.snapshot_root = snapshot_root
+        self._lock = threading.Lock()  # Guards the LRU only; never held while a database is copied
+        self._open: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}  # One cold open per tenant at a time
+        self._seen = set()  # Tenants opened before in this process; their old snapshot files may still be in use
+
+    def _open_tenant(self, info: TenantInfo) -> Tenant:
+        with self._lock:
+            clear_stale = info.tenant_id not in self._seen
+            self._seen.add(info.tenant_id)
+        snapshot_dir = os.path.join(self.snapshot_root, info.tenant_id)
+        snapshots = SnapshotManager(info.db_path, snapshot_dir=snapshot_dir, clear_stale=clear_stale)
+        print(f"[DEBUG] Opened tenant {info.tenant_id} ({info.db_path})")
+        return Tenant(info, snapshots)
+
+    def _close_later(self, tenant: Tenant):
+        # Caller must hold self._lock
+        vectorstore = tenant.info.vectorstore
+        if vectorstore and all(t.info.vectorstore != vectorstore for t in self._open.values()):
+            drop_retriever(vectorstore)
+        # close() waits for a reload that may be mid-copy; never wait under the pool lock or on the event loop
+        threading.Thread(target=tenant.snapshots.close, name=f"close-{tenant.info.tenant_id}", daemon=True).start()
+
+    def _evict_idle(self):
+        # Caller must hold self._lock
+        for tenant_id in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            tenant = self._open[tenant_id]
+            if tenant.active == 0:
+                del self._open[tenant_id]
+                self._close_later(tenant)
+                print(f"[DEBUG] Evicted tenant {tenant_id}")
+
+    def _checkout_open(self, info: TenantInfo) -> Optional[Tenant]:
+        # Caller must hold self._lock
+        tenant = self._open.get(info.tenant_id)
+        if tenant and tenant.info.db_path != info.db_path:
+            # Registry now points this tenant at another database
+            del self._open[info.tenant_id]
+            if tenant.active == 0:
+                self._close_later(tenant)
+            tenant = None
+        if tenant is None:
+            return None
+        tenant.info = info
+        tenant.active += 1  # Pinned before eviction runs, so it cannot be closed under us
+        self._open.move_to_end(info.tenant_id)
+        self._evict_idle()
+        return tenant
+
+    def _checkout(self, tenant_id: Optional[str]) -> Tenant:
+        info = self.registry.resolve(tenant_id)
+        if info is None:
+            raise KeyError(f"Unknown tenant '{tenant_id}'")
+
+        with self._lock:
+            tenant = self._checkout_open(info)
+            if tenant:
+                return tenant
+            opening = self._opening.setdefault(info.tenant_id, threading.Lock())
+
+        with opening:
+            with self._lock:
+                # Another query may have opened it while we waited
+                tenant = self._checkout_open(info)
+                if tenant:
+                    return tenant
+            # The first snapshot is a full copy of the database: do it without the pool lock
+            tenant = self._open_tenant(info)
+            with self._lock:
+                self._open[info.tenant_id] = tenant
+                return self._checkout_open(info)
+
+    def _release(self, tenant: Tenant):
+        with self._lock:
+            tenant.active -= 1
+            if tenant.active == 0 and self._open.get(tenant.info.tenant_id) is not tenant:
+                # Replaced while busy (registry change); release its files now
+                self._close_later(tenant)
+            self._evict_idle()
+
+    def pin(self, tenant_id: Optional[str] = None) -> Tuple[Tenant, DBSnapshot]:
+        """
+        Pin the tenant and its current snapshot; pair every call with `unpin()`.
+        Opening a cold tenant copies its database, so call this off the event loop.
+        """
+        tenant = self._checkout(tenant_id)
+        try:
+            return tenant, tenant.snapshots.pin()
+        except Exception:
+            self._release(tenant)
+            raise
+
+    def unpin(self, tenant: Tenant, snapshot: DBSnapshot):
+        try:
+            tenant.snapshots.unpin(snapshot)
+        finally:
+            self._release(tenant)
+
+    @contextmanager
+    def acquire(self, tenant_id: Optional[str] = None):
+        """Pin the tenant and its current snapshot for one query."""
+        tenant, snapshot = self.pin(tenant_id)
+        try:
+            yield snapshot
+        finally:
+            self.unpin(tenant, snapshot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "max_open": self.max_open,
+                "tenants": {tenant_id: tenant.snapshots.stats() for tenant_id, tenant in self._open.items()},
+            }
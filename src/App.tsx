@@ -144,6 +144,12 @@ function App() {
       console.log('Bot stopped typing');
     });
 
+    // Raw result rows arrive before the formal summary; typing indicator stays on until bot-response
+    newSocket.on('bot-preview', (data: { markdown: string }) => {
+      console.log('Received bot-preview');
+      sendBotMessage(data.markdown);
+    });
+
     newSocket.on('bot-typing', (typing: boolean) => {
       console.log('Bot typing status:', typing);
       setIsTyping(typing);